@@ -1,8 +1,30 @@
+from functools import cached_property, lru_cache
+
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Tuple
 import os
 from pathlib import Path
 
+# Resolve the .env path once at import time instead of in every class body
+_ENV_FILE = str(Path(__file__).parent / ".env")
+
+class DatabaseSettings(BaseSettings):
+    """Database settings, resolved lazily on first access via Settings.db"""
+
+    DATABASE_URL: str = ""
+    DB_HOST: str = ""
+    DB_PORT: str = ""
+    DB_NAME: str = ""
+    DB_USER: str = ""
+    DB_PASSWORD: str = ""
+    DB_SSL_MODE: str = "require"
+
+    class Config:
+        # Look for .env file in the api_server directory
+        env_file = _ENV_FILE
+        case_sensitive = True
+        extra = "ignore"  # Ignore extra fields from .env file
+
 class Settings(BaseSettings):
     """Application settings with environment variable support"""
     
@@ -13,22 +35,16 @@ class Settings(BaseSettings):
     
     # API Configuration
     API_V1_STR: str = "/api/v1"
-    ALLOWED_ORIGINS: List[str] = ["*"]  # Configure for production
+    ALLOWED_ORIGINS: Tuple[str, ...] = ("*",)  # Configure for production
     
     # OpenAI Configuration
     OPENAI_API_KEY: str = ""  # Load from environment variable
     OPENAI_MODEL: str = "gpt-3.5-turbo"
+    OPENAI_EXPLAIN_MODEL: str = "gpt-4o-mini"  # Cheaper tier; explanations don't need the SQL model
     OPENAI_TEMPERATURE: float = 0.2
     OPENAI_MAX_TOKENS: int = 1000
-    
-    # Database Configuration
-    DATABASE_URL: str = ""
-    DB_HOST: str = ""
-    DB_PORT: str = ""
-    DB_NAME: str = ""
-    DB_USER: str = ""
-    DB_PASSWORD: str = ""
-    DB_SSL_MODE: str = "require"
+    OPENAI_RPM: int = 500  # Requests-per-minute budget for the account
+    OPENAI_TPM: int = 200_000  # Tokens-per-minute budget for the account
     
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
@@ -38,9 +54,35 @@ class Settings(BaseSettings):
     
     class Config:
         # Look for .env file in the api_server directory
-        env_file = str(Path(__file__).parent / ".env")
+        env_file = _ENV_FILE
         case_sensitive = True
         extra = "ignore"  # Ignore extra fields from .env file
 
-# Create settings instance
-settings = Settings() 
\ No newline at end of file
+    @cached_property
+    def db(self) -> DatabaseSettings:
+        """Database settings, constructed on first access only.
+
+        Import paths that never touch the database (e.g. the /health
+        endpoint) skip DB env resolution entirely.
+        """
+        return DatabaseSettings()
+
+    def __getattr__(self, name: str):
+        # Keep settings.DB_* working for existing callers while the
+        # fields live on the lazy DatabaseSettings group
+        if name.startswith("DB_") or name == "DATABASE_URL":
+            return getattr(self.db, name)
+        return super().__getattr__(name)
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the cached Settings singleton.
+
+    Constructing Settings re-reads the .env file and re-runs pydantic
+    validation, so we only ever do it once per process. Usable directly
+    as a FastAPI dependency via Depends(get_settings).
+    """
+    return Settings()
+
+# Create settings instance (shared singleton)
+settings = get_settings() 
\ No newline at end of file
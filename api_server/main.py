@@ -1,28 +1,46 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import structlog
 import uvicorn
 from contextlib import asynccontextmanager
+import itertools
+import os
+import secrets
 import time
 from typing import Dict, Any
 
-from api_server.models import QueryRequest, QueryResponse, HealthResponse
-from api_server.services.nlq_service import NLQService
+from api_server.models import QueryRequest, QueryResponse, HealthResponse, ExplanationResponse
+from api_server.services.nlq_service import get_nlq_service, close_http_client
 from api_server.services.complete_service import CompleteService
 from api_server.config import settings
 
 
+_stack_renderer = structlog.processors.StackInfoRenderer()
+
+def _render_diagnostics(logger_obj, method_name, event_dict):
+    """Run stack/exc-info rendering only when it can produce output.
+
+    StackInfoRenderer and format_exc_info are wasted work on the
+    happy-path info logs that dominate per-request log volume, so they
+    are skipped unless the log is error-level or carries diagnostics.
+    """
+    if (method_name in ("error", "critical", "exception")
+            or "exc_info" in event_dict or "stack_info" in event_dict):
+        event_dict = _stack_renderer(logger_obj, method_name, event_dict)
+        event_dict = structlog.processors.format_exc_info(logger_obj, method_name, event_dict)
+    return event_dict
+
 # Configure structured logging
 structlog.configure(
     processors=[
+        structlog.contextvars.merge_contextvars,
         structlog.stdlib.filter_by_level,
         structlog.stdlib.add_logger_name,
         structlog.stdlib.add_log_level,
         structlog.stdlib.PositionalArgumentsFormatter(),
         structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.StackInfoRenderer(),
-        structlog.processors.format_exc_info,
+        _render_diagnostics,
         structlog.processors.UnicodeDecoder(),
         structlog.processors.JSONRenderer()
     ],
@@ -33,6 +51,23 @@ structlog.configure(
 )
 
 logger = structlog.get_logger()
+# Force the BoundLogger wrapper to materialize at import (filtered out
+# under INFO) so the first real request doesn't pay the first-call setup
+logger.debug("logger_initialized")
+
+# Lock-free monotonic counter for request IDs; unlike millisecond
+# timestamps it cannot collide under concurrent requests. The random
+# per-process token keeps IDs distinct across workers and restarts,
+# where the bare counter would restart at req_0 in every process.
+_PROC_TOKEN = secrets.token_hex(4)
+_req_counter = itertools.count().__next__
+
+# Populated once in lifespan; read per request by get_complete_service
+_complete_service: CompleteService = None
+
+def get_complete_service() -> CompleteService:
+    """FastAPI dependency returning the shared CompleteService singleton"""
+    return _complete_service
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -41,22 +76,33 @@ async def lifespan(app: FastAPI):
     logger.info("Starting SaaS Product Usage Data Assistant API")
     start_time = time.time()
     
-    # Initialize services
+    # Initialize services (CompleteService shares the NLQService singleton)
+    global _complete_service
     try:
-        app.state.nlq_service = NLQService()
-        app.state.complete_service = CompleteService()
+        _complete_service = CompleteService()
+        app.state.complete_service = _complete_service
+        app.state.nlq_service = get_nlq_service()
         logger.info("Services initialized successfully")
     except Exception as e:
         logger.error("Failed to initialize services", error=str(e))
         raise
+
+    # Warm the shared DB pool; non-fatal so the API still starts when the
+    # database is unreachable (queries retry pool creation lazily)
+    try:
+        await _complete_service.db_service.init_pool()
+    except Exception as e:
+        logger.warning("Database pool initialization failed", error=str(e))
     
     startup_time = time.time() - start_time
     logger.info("API startup completed", startup_time_ms=startup_time * 1000)
     
     yield
-    
+
     # Shutdown
     logger.info("Shutting down SaaS Product Usage Data Assistant API")
+    await _complete_service.db_service.close_pool()
+    await close_http_client()
 
 # Create FastAPI app with production settings
 app = FastAPI(
@@ -65,16 +111,19 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
-# Add CORS middleware for production
+# Add CORS middleware for production (immutable tuples; built once)
+_ALLOWED_METHODS = ("GET", "POST", "PUT", "DELETE")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE"],
-    allow_headers=["*"],
+    allow_methods=_ALLOWED_METHODS,
+    allow_headers=("*",),
 )
 
 @app.exception_handler(Exception)
@@ -85,7 +134,7 @@ async def global_exception_handler(request, exc):
                 path=request.url.path,
                 method=request.method)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
@@ -97,87 +146,137 @@ async def global_exception_handler(request, exc):
 @app.middleware("http")
 async def add_process_time_header(request, call_next):
     """Middleware to add request timing and logging"""
-    start_time = time.time()
-    
-    # Add request ID for tracing
-    request.state.request_id = f"req_{int(start_time * 1000)}"
-    
-    logger.info("Incoming request",
-                method=request.method,
-                path=request.url.path,
-                request_id=request.state.request_id)
-    
+    # Monitoring probes hit /health every few seconds; skip the logging
+    # and timing machinery entirely for them
+    if request.url.path == "/health":
+        return await call_next(request)
+
+    start_ns = time.perf_counter_ns()
+    request.state.request_id = f"req_{_PROC_TOKEN}_{_req_counter():x}"
+
+    # Bind request context once; every downstream log line picks it up
+    # via merge_contextvars without repeating the kwargs
+    structlog.contextvars.clear_contextvars()
+    structlog.contextvars.bind_contextvars(
+        request_id=request.state.request_id,
+        path=request.url.path,
+        method=request.method
+    )
+
+    logger.info("Incoming request")
+
     response = await call_next(request)
-    
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    
+
+    elapsed_ns = time.perf_counter_ns() - start_ns
+    response.headers["X-Process-Time"] = f"{elapsed_ns / 1e9:.6f}"
+
     logger.info("Request completed",
-                method=request.method,
-                path=request.url.path,
                 status_code=response.status_code,
-                process_time_ms=process_time * 1000,
-                request_id=request.state.request_id)
-    
+                process_time_ms=elapsed_ns // 1_000_000)
+
     return response
 
+# Health body serialized once at import; only the timestamp varies per probe
+_HEALTH_TEMPLATE = (
+    b'{"status":"healthy","service":"SaaS Product Usage Data Assistant",'
+    b'"version":"1.0.0","timestamp":%.6f}'
+)
+
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
     """Health check endpoint for monitoring"""
-    return HealthResponse(
-        status="healthy",
-        service="SaaS Product Usage Data Assistant",
-        version="1.0.0",
-        timestamp=time.time()
+    return Response(
+        content=_HEALTH_TEMPLATE % time.time(),
+        media_type="application/json"
     )
 
 @app.post("/api/v1/query", response_model=QueryResponse, tags=["Queries"])
 async def process_natural_language_query(
     request: QueryRequest,
-    complete_service: CompleteService = Depends(lambda: app.state.complete_service)
+    background_tasks: BackgroundTasks,
+    complete_service: CompleteService = Depends(get_complete_service)
 ):
     """
     Process natural language query and return complete response
-    
+
     This endpoint takes a natural language question about product usage data,
     generates SQL, executes it, and returns a natural language response.
+
+    With defer_explanation=true the response is sent as soon as the SQL
+    result is ready; the explanation is generated in a background task
+    and retrieved via GET /api/v1/explanation/{explanation_id}.
     """
     try:
         logger.info("Processing complete query request",
                    question=request.question,
-                   tenant_id=request.tenant_id,
-                   request_id=getattr(request, 'request_id', 'unknown'))
-        
+                   tenant_id=request.tenant_id)
+
         # Process the complete query flow
         response = await complete_service.process_query(
             question=request.question,
-            tenant_id=request.tenant_id
+            tenant_id=request.tenant_id,
+            defer_explanation=request.defer_explanation
         )
-        
+
+        # Runs after the response has been sent, off the request path
+        if response.explanation_id is not None:
+            background_tasks.add_task(
+                complete_service.resolve_explanation,
+                response.explanation_id,
+                request.question,
+                response.sql_query
+            )
+
         logger.info("Complete query processing completed",
                    question=request.question,
                    success=response.success,
-                   row_count=response.row_count,
-                   request_id=getattr(request, 'request_id', 'unknown'))
-        
-        return response
+                   row_count=response.row_count)
+
+        # Serialize straight through orjson; returning a Response skips
+        # FastAPI's per-field response-model validation pass, which is
+        # redundant for internally built data. Matters most for large
+        # result sets in the data field. response_model still documents
+        # the schema.
+        return ORJSONResponse(response.model_dump())
         
     except Exception as e:
         logger.error("Complete query processing failed",
                     question=request.question,
-                    error=str(e),
-                    request_id=getattr(request, 'request_id', 'unknown'))
-        
+                    error=str(e))
+
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process query: {str(e)}"
         )
 
+@app.get("/api/v1/explanation/{explanation_id}", response_model=ExplanationResponse, tags=["Queries"])
+async def get_deferred_explanation(
+    explanation_id: str,
+    complete_service: CompleteService = Depends(get_complete_service)
+):
+    """Poll for an explanation that was deferred to a background task"""
+    try:
+        explanation = await complete_service.get_explanation(explanation_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=404,
+            detail="Unknown or expired explanation_id"
+        )
+
+    return ORJSONResponse({
+        "explanation_id": explanation_id,
+        "status": "ready" if explanation is not None else "pending",
+        "explanation": explanation
+    })
+
 if __name__ == "__main__":
     uvicorn.run(
         "api_server.main:app",
         host="0.0.0.0",
         port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "4")),
         reload=settings.DEBUG,
         log_level="info"
     ) 
\ No newline at end of file
@@ -1,10 +1,19 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timezone
 
 class QueryRequest(BaseModel):
     """Request model for natural language query"""
-    
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "question": "How many users signed up in the last 30 days?",
+                "tenant_id": "tenant_123"
+            }
+        }
+    )
+
     question: str = Field(
         ...,
         description="Natural language question about product usage data",
@@ -18,14 +27,13 @@ class QueryRequest(BaseModel):
         description="Tenant identifier for data isolation",
         example="tenant_123"
     )
-    
-    class Config:
-        schema_extra = {
-            "example": {
-                "question": "How many users signed up in the last 30 days?",
-                "tenant_id": "tenant_123"
-            }
-        }
+
+    defer_explanation: bool = Field(
+        False,
+        description="Generate the SQL explanation in the background and "
+                    "expose it via /api/v1/explanation/{explanation_id} "
+                    "instead of waiting for it inline"
+    )
 
 class SQLResult(BaseModel):
     """Result model for SQL generation"""
@@ -64,7 +72,13 @@ class QueryResponse(BaseModel):
         None,
         description="Explanation of the generated SQL query"
     )
-    
+
+    explanation_id: Optional[str] = Field(
+        None,
+        description="Identifier for a deferred explanation; poll "
+                    "/api/v1/explanation/{explanation_id} to retrieve it"
+    )
+
     tenant_id: str = Field(
         ...,
         description="Tenant identifier"
@@ -97,10 +111,28 @@ class QueryResponse(BaseModel):
     )
     
     timestamp: datetime = Field(
-        default_factory=datetime.utcnow,
+        default_factory=lambda: datetime.now(timezone.utc),
         description="Timestamp when the response was generated"
     )
 
+class ExplanationResponse(BaseModel):
+    """Response model for deferred explanation polling"""
+
+    explanation_id: str = Field(
+        ...,
+        description="Identifier of the deferred explanation"
+    )
+
+    status: str = Field(
+        ...,
+        description="Either 'pending' or 'ready'"
+    )
+
+    explanation: Optional[str] = Field(
+        None,
+        description="Explanation text once the background task has finished"
+    )
+
 class HealthResponse(BaseModel):
     """Response model for health check endpoint"""
     
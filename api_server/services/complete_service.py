@@ -2,49 +2,180 @@
 Complete service that handles the full NLQ to natural language response flow
 """
 
+import orjson
+import re
 import structlog
-from typing import Optional, List, Dict, Any
+from cachetools import TTLCache
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional
+from uuid import uuid4
 import asyncio
 
 from api_server.models import SQLResult, QueryResponse
-from api_server.services.nlq_service import NLQService
-from sqlexecutor.db_service import DatabaseService
+from api_server.services.nlq_service import NLQService, get_nlq_service
+from sqlexecutor.db_service import DatabaseService, get_db_service, _get_redis
 
 logger = structlog.get_logger()
 
+# Mock result payloads shared across requests until the real DB path lands.
+# Frozen (immutable mapping, tuple containers) so concurrent requests can
+# safely share the same objects with zero per-call allocation.
+_COUNT_RESULT = MappingProxyType({
+    'data': ({'total_users': 1250},),
+    'columns': ('total_users',),
+    'row_count': 1
+})
+
+_FEATURE_RESULT = MappingProxyType({
+    'data': (
+        {'feature_name': 'Dashboard Analytics', 'total_events': 15420},
+        {'feature_name': 'User Management', 'total_events': 12340},
+        {'feature_name': 'Reporting', 'total_events': 9870}
+    ),
+    'columns': ('feature_name', 'total_events'),
+    'row_count': 3
+})
+
+_ACTIVITY_RESULT = MappingProxyType({
+    'data': (
+        {'user_name': 'John Doe', 'user_email': 'john@example.com', 'event_type': 'login', 'timestamp': '2024-01-15'},
+        {'user_name': 'Jane Smith', 'user_email': 'jane@example.com', 'event_type': 'feature_used', 'timestamp': '2024-01-14'}
+    ),
+    'columns': ('user_name', 'user_email', 'event_type', 'timestamp'),
+    'row_count': 2
+})
+
+_DEFAULT_RESULT = MappingProxyType({
+    'data': ({'result': 'Data retrieved successfully'},),
+    'columns': ('result',),
+    'row_count': 1
+})
+
+# Case-insensitive keyword patterns; re handles case folding internally so
+# no uppercased copy of the query/question is ever allocated
+_COUNT_RE = re.compile(r"\bCOUNT\b", re.IGNORECASE)
+_FEATURE_RE = re.compile(r"\b(?:POPULAR|FEATURES)\b", re.IGNORECASE)
+_ACTIVITY_RE = re.compile(r"\b(?:ACTIVITY|LAST)\b", re.IGNORECASE)
+
+# Precompiled dispatch table: first matching pattern wins
+_MOCK_TABLE = (
+    (_COUNT_RE, _COUNT_RESULT),
+    (_FEATURE_RE, _FEATURE_RESULT),
+    (_ACTIVITY_RE, _ACTIVITY_RESULT),
+)
+
+# Deferred explanations keyed by explanation_id; None marks a pending
+# entry. Clients have 10 minutes to poll before the entry expires.
+# Backed by Redis so polls work with multiple uvicorn workers; without
+# REDIS_URL deferral is disabled entirely (process_query falls back to
+# the inline explanation) and the per-process TTLCache below only
+# absorbs transient Redis failures mid-flight.
+_EXPLANATION_TTL = 600
+_EXPLANATION_STORE: TTLCache = TTLCache(maxsize=10_000, ttl=_EXPLANATION_TTL)
+
+def _explanation_key(explanation_id: str) -> str:
+    return f"expl:{explanation_id}"
+
+async def _store_explanation(explanation_id: str, explanation: Optional[str]) -> None:
+    """Persist a deferred explanation (None marks it pending)"""
+    cache = _get_redis()
+    if cache is not None:
+        try:
+            await cache.set(
+                _explanation_key(explanation_id),
+                orjson.dumps(explanation),
+                ex=_EXPLANATION_TTL
+            )
+            return
+        except Exception as e:
+            logger.warning("Explanation store write failed, using local fallback",
+                          explanation_id=explanation_id, error=str(e))
+    _EXPLANATION_STORE[explanation_id] = explanation
+
+async def _load_explanation(explanation_id: str) -> Optional[str]:
+    """Fetch a deferred explanation (None while pending)
+
+    Raises:
+        KeyError: if the id is unknown or has expired
+    """
+    cache = _get_redis()
+    if cache is not None:
+        try:
+            raw = await cache.get(_explanation_key(explanation_id))
+        except Exception as e:
+            logger.warning("Explanation store read failed, using local fallback",
+                          explanation_id=explanation_id, error=str(e))
+        else:
+            if raw is None:
+                raise KeyError(explanation_id)
+            return orjson.loads(raw)
+    return _EXPLANATION_STORE[explanation_id]
+
 class CompleteService:
     """Service that handles the complete NLQ to natural language response flow"""
     
     def __init__(self):
-        self.nlq_service = NLQService()
-        self.db_service = DatabaseService()
+        self.nlq_service = get_nlq_service()
+        self.db_service = get_db_service()
     
-    async def process_query(self, question: str, tenant_id: str) -> QueryResponse:
+    async def process_query(
+        self,
+        question: str,
+        tenant_id: str,
+        defer_explanation: bool = False
+    ) -> QueryResponse:
         """
         Process a natural language query and return a complete response
-        
+
         This method:
         1. Generates SQL from the natural language question
         2. Executes the SQL query
         3. Converts the results to natural language
         4. Returns the complete response
+
+        When defer_explanation is True the explanation is not generated
+        inline; the response carries an explanation_id instead and the
+        caller is expected to schedule resolve_explanation() so clients
+        can poll for the result.
         """
         try:
             logger.info("Starting complete query processing", 
                        question=question, tenant_id=tenant_id)
             
-            # Step 1: Generate SQL from natural language
+            # Step 1: Generate SQL from natural language (explanation is
+            # deferred so it can run concurrently with execution)
             sql_result = await self.nlq_service.generate_sql(
                 question=question,
-                tenant_id=tenant_id
+                tenant_id=tenant_id,
+                include_explanation=False
             )
-            
-            logger.info("SQL generated successfully", 
+
+            logger.info("SQL generated successfully",
                        sql_query=sql_result.sql_query)
-            
-            # Step 2: Execute the SQL query
-            db_result = await self._execute_sql(sql_result.sql_query, tenant_id)
-            
+
+            # Step 2: Execute the SQL query and generate its explanation
+            # concurrently — both depend only on the generated SQL. With
+            # defer_explanation the explanation is pushed off the request
+            # path entirely and only the execution awaits here.
+            explanation_id = None
+            if defer_explanation and _get_redis() is None:
+                # Without Redis the store is per-process and the default
+                # deployment runs several workers, so a handed-out id
+                # would 404 on most polls; answer inline instead
+                logger.warning("Deferred explanation requires REDIS_URL, "
+                              "generating inline instead")
+                defer_explanation = False
+            if defer_explanation:
+                explanation_id = uuid4().hex
+                await _store_explanation(explanation_id, None)
+                db_result = await self._execute_sql(sql_result.sql_query, tenant_id)
+                explanation = None
+            else:
+                db_result, explanation = await asyncio.gather(
+                    self._execute_sql(sql_result.sql_query, tenant_id),
+                    self.nlq_service._generate_explanation(question, sql_result.sql_query)
+                )
+
             # Step 3: Generate natural language response
             natural_response = await self._generate_natural_response(
                 question=question,
@@ -54,12 +185,14 @@ class CompleteService:
                 row_count=db_result.get('row_count', 0)
             )
             
-            # Step 4: Build complete response
-            response = QueryResponse(
+            # Step 4: Build complete response. All fields are generated
+            # internally and trusted, so skip pydantic validation.
+            response = QueryResponse.model_construct(
                 success=True,
                 question=question,
                 sql_query=sql_result.sql_query,
-                explanation=sql_result.explanation,
+                explanation=explanation,
+                explanation_id=explanation_id,
                 tenant_id=tenant_id,
                 data=db_result.get('data'),
                 columns=db_result.get('columns'),
@@ -77,7 +210,7 @@ class CompleteService:
                         question=question, error=str(e))
             
             # Return error response
-            return QueryResponse(
+            return QueryResponse.model_construct(
                 success=False,
                 question=question,
                 sql_query="",
@@ -87,47 +220,48 @@ class CompleteService:
                 natural_language_response=f"Sorry, I couldn't process your question: {str(e)}"
             )
     
-    async def _execute_sql(self, sql_query: str, tenant_id: str) -> Dict[str, Any]:
+    async def resolve_explanation(
+        self, explanation_id: str, question: str, sql_query: str
+    ) -> None:
+        """Generate a deferred explanation and store it for polling
+
+        Runs as a FastAPI background task after the query response has
+        already been sent, so its latency is invisible to the client.
+        """
+        try:
+            explanation = await self.nlq_service._generate_explanation(
+                question, sql_query
+            )
+            await _store_explanation(explanation_id, explanation)
+            logger.info("Deferred explanation ready",
+                       explanation_id=explanation_id)
+        except Exception as e:
+            logger.error("Deferred explanation failed",
+                        explanation_id=explanation_id, error=str(e))
+
+    @staticmethod
+    async def get_explanation(explanation_id: str) -> Optional[str]:
+        """Look up a deferred explanation (None while still pending)
+
+        Raises:
+            KeyError: if the id is unknown or has expired
+        """
+        return await _load_explanation(explanation_id)
+
+    async def _execute_sql(self, sql_query: str, tenant_id: str) -> Mapping[str, Any]:
         """Execute SQL query and return results"""
         try:
             # For now, we'll return mock data since we haven't fully integrated the database
             # In the real implementation, this would call self.db_service.execute_query()
             
             logger.info("Executing SQL query", sql_query=sql_query)
-            
+
             # Mock data based on the type of query
-            if "COUNT" in sql_query.upper():
-                return {
-                    'data': [{'total_users': 1250}],
-                    'columns': ['total_users'],
-                    'row_count': 1
-                }
-            elif "POPULAR" in sql_query.upper() or "FEATURES" in sql_query.upper():
-                return {
-                    'data': [
-                        {'feature_name': 'Dashboard Analytics', 'total_events': 15420},
-                        {'feature_name': 'User Management', 'total_events': 12340},
-                        {'feature_name': 'Reporting', 'total_events': 9870}
-                    ],
-                    'columns': ['feature_name', 'total_events'],
-                    'row_count': 3
-                }
-            elif "ACTIVITY" in sql_query.upper() or "LAST" in sql_query.upper():
-                return {
-                    'data': [
-                        {'user_name': 'John Doe', 'user_email': 'john@example.com', 'event_type': 'login', 'timestamp': '2024-01-15'},
-                        {'user_name': 'Jane Smith', 'user_email': 'jane@example.com', 'event_type': 'feature_used', 'timestamp': '2024-01-14'}
-                    ],
-                    'columns': ['user_name', 'user_email', 'event_type', 'timestamp'],
-                    'row_count': 2
-                }
-            else:
-                return {
-                    'data': [{'result': 'Data retrieved successfully'}],
-                    'columns': ['result'],
-                    'row_count': 1
-                }
-                
+            for pattern, result in _MOCK_TABLE:
+                if pattern.search(sql_query):
+                    return result
+            return _DEFAULT_RESULT
+
         except Exception as e:
             logger.error("SQL execution failed", sql_query=sql_query, error=str(e))
             raise
@@ -151,11 +285,11 @@ class CompleteService:
             if row_count == 0:
                 return f"Based on your question '{question}', I found no data matching your criteria."
             
-            if "COUNT" in sql_query.upper():
+            if _COUNT_RE.search(sql_query):
                 count_value = data[0].get('total_users', data[0].get(list(data[0].keys())[0]))
                 return f"You have {count_value} users in your system."
-            
-            elif "POPULAR" in question.upper() or "FEATURES" in question.upper():
+
+            elif _FEATURE_RE.search(question):
                 if row_count == 1:
                     feature = data[0]['feature_name']
                     events = data[0]['total_events']
@@ -165,7 +299,7 @@ class CompleteService:
                     top_events = data[0]['total_events']
                     return f"The most popular feature is {top_feature} with {top_events} usage events. I found {row_count} features in total."
             
-            elif "ACTIVITY" in question.upper() or "LAST" in question.upper():
+            elif _ACTIVITY_RE.search(question):
                 return f"I found {row_count} user activities in the specified time period. The most recent activity was by {data[0]['user_name']} ({data[0]['event_type']})."
             
             else:
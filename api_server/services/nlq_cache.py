@@ -0,0 +1,135 @@
+"""
+Semantic cache for generated SQL, keyed on question embeddings
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import hnswlib
+import numpy as np
+import structlog
+
+from api_server.models import SQLResult
+
+logger = structlog.get_logger()
+
+# Embedding dimension for text-embedding-3-small
+EMBEDDING_DIM = 1536
+
+class SemanticCache:
+    """In-memory semantic cache mapping question embeddings to SQLResults
+
+    Paraphrases of an already-answered question are served from cache via
+    cosine similarity lookup instead of paying for new chat completions.
+    Indexes are scoped per (tenant_id, schema hash) so hits never cross
+    tenants or survive a schema change, and entries expire after a TTL.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: int = 3600,
+        max_items: int = 10_000
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+
+        # One HNSW index plus a parallel entry list per scope; expired
+        # entries are marked deleted in the index and their labels kept
+        # in a per-scope free list for reuse, so a scope keeps admitting
+        # new entries after old ones age out
+        self._indexes: Dict[str, hnswlib.Index] = {}
+        self._entries: Dict[str, List[Optional[Tuple[float, SQLResult]]]] = {}
+        self._free_labels: Dict[str, List[int]] = {}
+
+    def _scope(self, tenant_id: str, schema_hash: str) -> str:
+        return f"{tenant_id}:{schema_hash}"
+
+    def _index_for(self, scope: str) -> hnswlib.Index:
+        index = self._indexes.get(scope)
+        if index is None:
+            index = hnswlib.Index(space='cosine', dim=EMBEDDING_DIM)
+            index.init_index(max_elements=self.max_items, ef_construction=200, M=16)
+            self._indexes[scope] = index
+            self._entries[scope] = []
+            self._free_labels[scope] = []
+        return index
+
+    def _evict(self, scope: str, label: int) -> None:
+        """Mark an expired entry deleted and recycle its label"""
+        self._indexes[scope].mark_deleted(label)
+        self._entries[scope][label] = None
+        self._free_labels[scope].append(label)
+
+    def lookup(self, tenant_id: str, schema_hash: str, embedding: np.ndarray) -> Optional[SQLResult]:
+        """
+        Return the cached SQLResult for the nearest stored question
+
+        Args:
+            tenant_id: Tenant identifier scoping the lookup
+            schema_hash: Hash of the schema the SQL was generated against
+            embedding: Embedding vector of the incoming question
+
+        Returns:
+            The cached SQLResult on a sufficiently similar, unexpired hit,
+            otherwise None
+        """
+        scope = self._scope(tenant_id, schema_hash)
+        index = self._indexes.get(scope)
+        if index is None or index.get_current_count() == 0:
+            return None
+
+        # Evict-and-retry: when the nearest neighbor has expired, delete
+        # it from the index and query again so a valid near-duplicate
+        # behind it can still be served
+        while True:
+            try:
+                labels, distances = index.knn_query(embedding.reshape(1, -1), k=1)
+            except RuntimeError:
+                # Every element in the index is marked deleted
+                return None
+
+            similarity = 1.0 - float(distances[0][0])
+            if similarity < self.similarity_threshold:
+                return None
+
+            label = int(labels[0][0])
+            expires_at, result = self._entries[scope][label]
+            if expires_at < time.monotonic():
+                self._evict(scope, label)
+                continue
+
+            logger.info("Semantic cache hit",
+                        tenant_id=tenant_id, similarity=similarity)
+            return result
+
+    def store(self, tenant_id: str, schema_hash: str, embedding: np.ndarray, result: SQLResult) -> None:
+        """Store a freshly generated SQLResult under the question embedding"""
+        scope = self._scope(tenant_id, schema_hash)
+        index = self._index_for(scope)
+        entries = self._entries[scope]
+        free_labels = self._free_labels[scope]
+
+        if not free_labels and len(entries) >= self.max_items:
+            # Sweep for expired entries before declaring the scope full
+            now = time.monotonic()
+            for label, entry in enumerate(entries):
+                if entry is not None and entry[0] < now:
+                    self._evict(scope, label)
+            if not free_labels:
+                logger.warning("Semantic cache full, skipping store",
+                               tenant_id=tenant_id)
+                return
+
+        expires_at = time.monotonic() + self.ttl_seconds
+        if free_labels:
+            # Reuse a deleted slot: unmark it, then add_items with the
+            # same label updates the stored vector in place
+            label = free_labels.pop()
+            index.unmark_deleted(label)
+            entries[label] = (expires_at, result)
+        else:
+            label = len(entries)
+            entries.append((expires_at, result))
+        index.add_items(embedding.reshape(1, -1), [label])
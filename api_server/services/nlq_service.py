@@ -1,143 +1,360 @@
-from openai import OpenAI
+import hashlib
+import json
+import re
+import textwrap
+from functools import lru_cache
+
+import httpx
+import numpy as np
+import sqlglot
+import tiktoken
+from sqlglot import exp
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
+from openai import AsyncOpenAI, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 import structlog
 from typing import Optional
 from api_server.models import SQLResult
+from api_server.services.nlq_cache import SemanticCache
+from api_server.services.request_coalescer import RequestCoalescer
 from api_server.config import settings
+from sqlexecutor.safety import is_query_safe
 
 logger = structlog.get_logger()
 
+# Embedding model used for semantic cache lookups
+_EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Markdown fence (optionally tagged sql/postgres/postgresql) wrapping the
+# model output, and a bare leading language tag like "sql SELECT ..."
+_FENCE_RE = re.compile(
+    r'^\s*```(?:postgresql|postgres|sql)?\s*\n?(.*?)\n?```\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+_LEADING_LANG_RE = re.compile(r'^(?:postgresql|postgres|sql)\s+', re.IGNORECASE)
+
+# Prompt text is built once at import and shared by every NLQService
+# instance. Dedenting strips the indentation whitespace that previously
+# rode along into every OpenAI request as wasted prompt tokens.
+
+# Database schema context for the SaaS usage data
+_DATABASE_SCHEMA = textwrap.dedent("""
+    Database Schema for SaaS Product Usage Analytics:
+
+    Table: tenants
+    - id (character varying) - Primary key, tenant identifier
+    - name (character varying) - Tenant name
+    - industry (character varying) - Industry classification
+
+    Table: users
+    - id (character varying) - Primary key, user identifier
+    - tenant_id (character varying) - Foreign key to tenants.id
+    - name (character varying) - User's full name
+    - email (character varying) - User's email address
+    - signup_date (date) - Date when user signed up
+
+    Table: features
+    - id (character varying) - Primary key, feature identifier
+    - name (character varying) - Feature name
+    - category (character varying) - Feature category
+
+    Table: usage_events
+    - id (character varying) - Primary key, event identifier
+    - user_id (character varying) - Foreign key to users.id
+    - feature_id (character varying) - Foreign key to features.id
+    - event_type (character varying) - Type of usage event (e.g., 'login', 'feature_used', 'export')
+    - timestamp (timestamp without time zone) - When the event occurred
+
+    Relationships:
+    - users.tenant_id -> tenants.id (Many-to-One)
+    - usage_events.user_id -> users.id (Many-to-One)
+    - usage_events.feature_id -> features.id (Many-to-One)
+
+    Business Context:
+    - This is a multi-tenant SaaS application
+    - Each tenant has multiple users
+    - Users interact with features, creating usage events
+    - All queries must include tenant isolation via tenant_id filter
+""").strip()
+
+# Static system prompt, byte-identical across requests so OpenAI's
+# automatic prompt caching can reuse the prefix; all dynamic values
+# (tenant_id, question) ride in the user message instead
+_SQL_SYSTEM_PROMPT = textwrap.dedent("""
+    You are a SQL expert specializing in SaaS product usage analytics.
+
+    {schema}
+
+    CRITICAL RULES:
+    1. ALWAYS include a tenant_id filter in the WHERE clause, written with the literal placeholder $1 (e.g. tenant_id = $1); never inline the tenant_id value
+    2. Use only SELECT statements - no INSERT, UPDATE, DELETE, DROP, etc.
+    3. Use proper PostgreSQL syntax
+    4. Return only the SQL query, no explanations in the query itself
+    5. Use appropriate aggregations (COUNT, SUM, AVG, MAX, MIN) when needed
+    6. Handle date ranges with PostgreSQL date functions
+    7. Join tables appropriately when needed
+    8. Use meaningful column aliases for clarity
+
+    Common patterns:
+    - Active users: users with recent usage_events (last 30 days)
+    - Feature adoption: COUNT(DISTINCT user_id) from usage_events
+    - User growth: COUNT(*) from users with date filters
+    - Usage frequency: COUNT(*) from usage_events with grouping
+""").strip().format(schema=_DATABASE_SCHEMA)
+
+# Static system messages for the explanation and NL-response calls
+_EXPLAIN_SYSTEM = {
+    "role": "system",
+    "content": textwrap.dedent("""
+        You are a data analyst explaining SQL queries in simple terms.
+
+        Provide a brief, business-friendly explanation of what the SQL query does
+        and how it answers the user's question. Keep it under 2 sentences.
+    """).strip()
+}
+_NL_RESPONSE_SYSTEM = {
+    "role": "system",
+    "content": textwrap.dedent("""
+        You are a helpful data analyst assistant. Your job is to explain SQL query results in natural language.
+
+        Given a user's question and the results from a SQL query, provide a clear, concise, and helpful answer.
+
+        Guidelines:
+        - Be conversational and friendly
+        - Include the actual numbers/data from the results
+        - Explain what the data means in business terms
+        - Keep responses under 3 sentences unless more detail is needed
+        - If no data is found, explain what that means
+        - Use appropriate units and formatting for numbers
+    """).strip()
+}
+
+# Scopes the semantic/exact caches; a schema change invalidates them
+_SCHEMA_HASH = hashlib.sha256(_DATABASE_SCHEMA.encode()).hexdigest()[:12]
+
+# Single shared HTTP client behind every AsyncOpenAI call: keep-alive
+# connections to api.openai.com are reused across requests, avoiding a
+# fresh DNS lookup and TLS handshake on cold paths
+_HTTPX_CLIENT = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+    timeout=httpx.Timeout(30.0, connect=5.0)
+)
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client (called on app shutdown)"""
+    await _HTTPX_CLIENT.aclose()
+
+# Shared token buckets pre-throttling every completion under the account's
+# RPM/TPM budget, so bursts queue here instead of burning 429 retries
+RPM_LIMITER = AsyncLimiter(max_rate=settings.OPENAI_RPM, time_period=60)
+TPM_LIMITER = AsyncLimiter(max_rate=settings.OPENAI_TPM, time_period=60)
+
+@lru_cache(maxsize=4)
+def _encoding_for(model: str):
+    """tiktoken encoding for the model, falling back to cl100k_base"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def _estimate_tokens(model: str, messages: list, max_tokens: int) -> int:
+    """Estimate the token cost of a completion for TPM throttling"""
+    encoding = _encoding_for(model)
+    prompt_tokens = sum(len(encoding.encode(m["content"])) for m in messages)
+    return prompt_tokens + max_tokens
+
 class NLQService:
     """Natural Language Query service for SQL generation"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=_HTTPX_CLIENT
+        )
         self.model = settings.OPENAI_MODEL
+        self.explain_model = settings.OPENAI_EXPLAIN_MODEL
         self.temperature = settings.OPENAI_TEMPERATURE
         self.max_tokens = settings.OPENAI_MAX_TOKENS
         
-        # Database schema context for your SaaS usage data
-        self.database_schema = """
-        Database Schema for SaaS Product Usage Analytics:
-        
-        Table: tenants
-        - id (character varying) - Primary key, tenant identifier
-        - name (character varying) - Tenant name
-        - industry (character varying) - Industry classification
-        
-        Table: users
-        - id (character varying) - Primary key, user identifier
-        - tenant_id (character varying) - Foreign key to tenants.id
-        - name (character varying) - User's full name
-        - email (character varying) - User's email address
-        - signup_date (date) - Date when user signed up
-        
-        Table: features
-        - id (character varying) - Primary key, feature identifier
-        - name (character varying) - Feature name
-        - category (character varying) - Feature category
-        
-        Table: usage_events
-        - id (character varying) - Primary key, event identifier
-        - user_id (character varying) - Foreign key to users.id
-        - feature_id (character varying) - Foreign key to features.id
-        - event_type (character varying) - Type of usage event (e.g., 'login', 'feature_used', 'export')
-        - timestamp (timestamp without time zone) - When the event occurred
-        
-        Relationships:
-        - users.tenant_id -> tenants.id (Many-to-One)
-        - usage_events.user_id -> users.id (Many-to-One)
-        - usage_events.feature_id -> features.id (Many-to-One)
-        
-        Business Context:
-        - This is a multi-tenant SaaS application
-        - Each tenant has multiple users
-        - Users interact with features, creating usage events
-        - All queries must include tenant isolation via tenant_id filter
-        """
-    
-    async def generate_sql(self, question: str, tenant_id: str) -> SQLResult:
+        # Shared module-level prompt constants (dedented, built once at
+        # import); instance attributes remain the access points
+        self.database_schema = _DATABASE_SCHEMA
+        self._sql_system_prompt = _SQL_SYSTEM_PROMPT
+        self._explain_system = _EXPLAIN_SYSTEM
+        self._nl_response_system = _NL_RESPONSE_SYSTEM
+
+        # Semantic cache: paraphrased repeats of a question skip OpenAI
+        # entirely. Scoped by schema hash so a schema change invalidates.
+        self._semantic_cache = SemanticCache()
+        self._schema_hash = _SCHEMA_HASH
+
+        # Exact-match cache for deterministic generations (temperature 0):
+        # identical repeated questions skip OpenAI with zero latency
+        self._exact_cache = TTLCache(maxsize=10_000, ttl=3600)
+        self._exact_hits = 0
+        self._exact_misses = 0
+
+        # Coalesces concurrent generations into batched completions when
+        # traffic is bursty; single requests go through the direct path
+        self._coalescer = RequestCoalescer(self)
+
+    async def generate_sql(self, question: str, tenant_id: str, include_explanation: bool = True) -> SQLResult:
         """
         Generate SQL query from natural language question
-        
+
         Args:
             question: Natural language question about product usage data
             tenant_id: Tenant identifier for data isolation
-            
+            include_explanation: Generate the explanation inline; callers
+                that overlap it with query execution pass False and call
+                _generate_explanation themselves
+
         Returns:
             SQLResult containing the generated SQL and explanation
         """
         try:
-            logger.info("Generating SQL from question", 
-                       question=question, 
+            logger.info("Generating SQL from question",
+                       question=question,
                        tenant_id=tenant_id)
-            
-            # Create system message with schema context
-            system_message = {
-                "role": "system",
-                "content": f"""You are a SQL expert specializing in SaaS product usage analytics.
-                
-                {self.database_schema}
-                
-                CRITICAL RULES:
-                1. ALWAYS include 'tenant_id = '{tenant_id}' in WHERE clause for data isolation
-                2. Use only SELECT statements - no INSERT, UPDATE, DELETE, DROP, etc.
-                3. Use proper PostgreSQL syntax
-                4. Return only the SQL query, no explanations in the query itself
-                5. Use appropriate aggregations (COUNT, SUM, AVG, MAX, MIN) when needed
-                6. Handle date ranges with PostgreSQL date functions
-                7. Join tables appropriately when needed
-                8. Use meaningful column aliases for clarity
-                
-                Common patterns:
-                - Active users: users with recent usage_events (last 30 days)
-                - Feature adoption: COUNT(DISTINCT user_id) from usage_events
-                - User growth: COUNT(*) from users with date filters
-                - Usage frequency: COUNT(*) from usage_events with grouping
-                """
-            }
-            
-            # Create user message
-            user_message = {
-                "role": "user",
-                "content": question
-            }
-            
-            # Call OpenAI API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[system_message, user_message],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
-            
-            # Extract SQL query
-            sql_query = response.choices[0].message.content.strip()
-            
-            # Clean up any markdown formatting
-            sql_query = sql_query.strip("` \n")
-            if sql_query.startswith("sql"):
-                sql_query = sql_query[3:].strip()
-            
+
+            # Exact-match cache first: only valid when generation is
+            # deterministic, and cheaper than an embedding round-trip
+            exact_key = None
+            if self.temperature == 0:
+                exact_key = self._exact_cache_key(question, tenant_id)
+                cached = self._exact_cache.get(exact_key)
+                if cached is not None:
+                    self._exact_hits += 1
+                    logger.info("Exact SQL cache hit",
+                               tenant_id=tenant_id,
+                               hits=self._exact_hits,
+                               misses=self._exact_misses)
+                    return await self._ensure_explanation(cached, question, include_explanation)
+                self._exact_misses += 1
+
+            # Then the semantic cache, before paying for a completion
+            embedding = await self._embed_question(question)
+            if embedding is not None:
+                cached = self._semantic_cache.lookup(tenant_id, self._schema_hash, embedding)
+                if cached is not None:
+                    return await self._ensure_explanation(cached, question, include_explanation)
+
+            # Generate the SQL, batching with concurrent requests when
+            # traffic is bursty enough to fill the coalescing window
+            sql_query = await self._coalescer.submit(question, tenant_id)
+
             # Generate explanation
-            explanation = await self._generate_explanation(question, sql_query)
+            explanation = None
+            if include_explanation:
+                explanation = await self._generate_explanation(question, sql_query)
             
             logger.info("SQL generation successful", 
                        question=question,
                        sql_query=sql_query,
                        tenant_id=tenant_id)
             
-            return SQLResult(
+            result = SQLResult(
                 sql_query=sql_query,
                 explanation=explanation
             )
-            
+
+            if exact_key is not None:
+                self._exact_cache[exact_key] = result
+            if embedding is not None:
+                self._semantic_cache.store(tenant_id, self._schema_hash, embedding, result)
+
+            return result
+
         except Exception as e:
-            logger.error("SQL generation failed", 
+            logger.error("SQL generation failed",
                         question=question,
                         error=str(e),
                         tenant_id=tenant_id)
             raise Exception(f"Failed to generate SQL: {str(e)}")
-    
+
+    @retry(retry=retry_if_exception_type(RateLimitError),
+           wait=wait_random_exponential(1, 20),
+           stop=stop_after_attempt(6))
+    async def _throttled_completion(self, **kwargs):
+        """chat.completions.create gated by the shared RPM/TPM limiters
+
+        Residual 429s (shared account, estimate drift) are retried with
+        random exponential backoff.
+        """
+        estimated_tokens = _estimate_tokens(
+            kwargs["model"], kwargs["messages"], kwargs.get("max_tokens", 0)
+        )
+        async with RPM_LIMITER:
+            await TPM_LIMITER.acquire(estimated_tokens)
+            return await self.client.chat.completions.create(**kwargs)
+
+    async def _create_sql_completion(self, question: str, tenant_id: str) -> str:
+        """Issue a single SQL-generation completion and clean its output"""
+        # Static system message (cacheable prefix) with schema context
+        system_message = {
+            "role": "system",
+            "content": self._sql_system_prompt
+        }
+
+        # User message; the tenant filter is the $1 placeholder, so the
+        # tenant_id value itself never enters the prompt
+        user_message = {
+            "role": "user",
+            "content": question
+        }
+
+        # Call OpenAI API (async client; does not block the event loop)
+        response = await self._throttled_completion(
+            model=self.model,
+            messages=[system_message, user_message],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens
+        )
+
+        return self._clean_sql(response.choices[0].message.content)
+
+    @staticmethod
+    def _clean_sql(content: str) -> str:
+        """Strip markdown formatting and language tags from model output"""
+        match = _FENCE_RE.match(content)
+        sql_query = (match.group(1) if match else content).strip()
+        return _LEADING_LANG_RE.sub("", sql_query, count=1)
+
+    def _exact_cache_key(self, question: str, tenant_id: str) -> str:
+        """Stable cache key over everything that affects the generated SQL"""
+        payload = json.dumps(
+            {'m': self.model, 't': tenant_id, 'q': question, 's': self._schema_hash},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def _ensure_explanation(self, result: SQLResult, question: str, include_explanation: bool) -> SQLResult:
+        """Fill in the explanation on a cache hit when the caller wants one"""
+        if include_explanation and result.explanation is None:
+            explanation = await self._generate_explanation(question, result.sql_query)
+            return SQLResult(sql_query=result.sql_query, explanation=explanation)
+        return result
+
+    async def _embed_question(self, question: str) -> Optional[np.ndarray]:
+        """
+        Embed the question for semantic cache lookups
+
+        Returns:
+            The embedding vector, or None if embedding failed (the
+            cache is then bypassed rather than failing the request)
+        """
+        try:
+            response = await self.client.embeddings.create(
+                model=_EMBEDDING_MODEL,
+                input=question
+            )
+            return np.asarray(response.data[0].embedding, dtype=np.float32)
+        except Exception as e:
+            logger.warning("Failed to embed question for semantic cache", error=str(e))
+            return None
+
     async def _generate_explanation(self, question: str, sql_query: str) -> str:
         """
         Generate explanation for the SQL query
@@ -150,22 +367,20 @@ class NLQService:
             Explanation of what the SQL query does
         """
         try:
-            explanation_prompt = {
-                "role": "system",
-                "content": """You are a data analyst explaining SQL queries in simple terms.
-                
-                Provide a brief, business-friendly explanation of what the SQL query does
-                and how it answers the user's question. Keep it under 2 sentences."""
-            }
-            
+            # Simple queries get a templated explanation straight from the
+            # AST — no LLM round-trip needed for the median request
+            templated = self._template_explanation(sql_query)
+            if templated is not None:
+                return templated
+
             user_message = {
                 "role": "user",
                 "content": f"Question: {question}\n\nSQL Query: {sql_query}\n\nExplain what this query does:"
             }
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[explanation_prompt, user_message],
+
+            response = await self._throttled_completion(
+                model=self.explain_model,
+                messages=[self._explain_system, user_message],
                 temperature=0.3,
                 max_tokens=200
             )
@@ -175,6 +390,51 @@ class NLQService:
         except Exception as e:
             logger.warning("Failed to generate explanation", error=str(e))
             return "Generated SQL query to answer your question about product usage data."
+
+    @staticmethod
+    def _template_explanation(sql_query: str) -> Optional[str]:
+        """
+        Derive a canned explanation for simple queries from the SQL AST
+
+        Args:
+            sql_query: Generated SQL query
+
+        Returns:
+            A short templated explanation, or None when the query is too
+            complex to template (joins, multiple aggregates) and the LLM
+            fallback should be used
+        """
+        # SqlglotError also covers TokenError, which ParseError does not;
+        # any parse failure just means "let the LLM explain it"
+        try:
+            tree = sqlglot.parse_one(sql_query, read='postgres')
+        except sqlglot.errors.SqlglotError:
+            return None
+
+        if not isinstance(tree, exp.Select) or tree.find(exp.Join) is not None:
+            return None
+
+        aggregates = list(tree.find_all(exp.AggFunc))
+        if len(aggregates) > 1:
+            return None
+
+        from_clause = tree.args.get('from')
+        if from_clause is None or not isinstance(from_clause.this, exp.Table):
+            return None
+        table_name = from_clause.this.name
+
+        where = tree.args.get('where')
+        predicate_summary = (
+            f" filtered by {where.this.sql(dialect='postgres')}"
+            if where is not None else ""
+        )
+
+        if aggregates and isinstance(aggregates[0], exp.Count):
+            return f"Counts rows in {table_name}{predicate_summary}."
+        if aggregates:
+            agg_sql = aggregates[0].sql(dialect='postgres')
+            return f"Computes {agg_sql} over {table_name}{predicate_summary}."
+        return f"Selects rows from {table_name}{predicate_summary}."
     
     def validate_sql_safety(self, sql_query: str) -> bool:
         """
@@ -186,23 +446,7 @@ class NLQService:
         Returns:
             True if query is safe, False otherwise
         """
-        query_upper = sql_query.upper().strip()
-        
-        # Must start with SELECT
-        if not query_upper.startswith('SELECT'):
-            return False
-        
-        # Check for dangerous keywords
-        dangerous_keywords = [
-            'INSERT', 'UPDATE', 'DELETE', 'DROP', 'TRUNCATE', 'ALTER',
-            'CREATE', 'GRANT', 'REVOKE', 'EXECUTE', 'EXEC', 'UNION'
-        ]
-        
-        for keyword in dangerous_keywords:
-            if keyword in query_upper:
-                return False
-        
-        return True
+        return is_query_safe(sql_query)
     
     async def generate_natural_language_response(self, question: str, sql_query: str, query_results: list) -> str:
         """
@@ -220,22 +464,6 @@ class NLQService:
             # Format the results for the LLM
             results_text = str(query_results) if query_results else "No data found"
             
-            response_prompt = {
-                "role": "system",
-                "content": """You are a helpful data analyst assistant. Your job is to explain SQL query results in natural language.
-
-                Given a user's question and the results from a SQL query, provide a clear, concise, and helpful answer.
-                
-                Guidelines:
-                - Be conversational and friendly
-                - Include the actual numbers/data from the results
-                - Explain what the data means in business terms
-                - Keep responses under 3 sentences unless more detail is needed
-                - If no data is found, explain what that means
-                - Use appropriate units and formatting for numbers
-                """
-            }
-            
             user_message = {
                 "role": "user",
                 "content": f"""User Question: {question}
@@ -247,9 +475,9 @@ Query Results: {results_text}
 Please provide a natural language answer based on this data:"""
             }
             
-            response = self.client.chat.completions.create(
+            response = await self._throttled_completion(
                 model=self.model,
-                messages=[response_prompt, user_message],
+                messages=[self._nl_response_system, user_message],
                 temperature=0.3,
                 max_tokens=300
             )
@@ -258,4 +486,13 @@ Please provide a natural language answer based on this data:"""
             
         except Exception as e:
             logger.warning("Failed to generate natural language response", error=str(e))
-            return f"Based on the data, here are the results for your question: {question}" 
\ No newline at end of file
+            return f"Based on the data, here are the results for your question: {question}"
+
+@lru_cache(maxsize=1)
+def get_nlq_service() -> NLQService:
+    """Return the shared NLQService singleton.
+
+    The service holds an OpenAI client with its own HTTP connection pool,
+    so every caller should share a single instance.
+    """
+    return NLQService() 
\ No newline at end of file
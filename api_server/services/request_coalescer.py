@@ -0,0 +1,118 @@
+"""
+Coalesces concurrent SQL-generation requests into batched OpenAI calls
+"""
+
+import asyncio
+import json
+from typing import List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+# Appended as a second system message so the large static prompt prefix
+# stays byte-identical with the single-request path
+_BATCH_INSTRUCTIONS = (
+    "You will receive a JSON array of independent requests, each with an "
+    "index i and a question. Respond with ONLY a JSON array of the same "
+    "length where element i is the SQL query answering question i, with "
+    "the tenant filter written as tenant_id = $1. No markdown, no "
+    "explanations."
+)
+
+class RequestCoalescer:
+    """Batches concurrent SQL generations into single OpenAI calls
+
+    Under bursty traffic the OpenAI requests-per-minute limit becomes the
+    bottleneck; independent questions arriving within a short window are
+    folded into one completion that returns a JSON array of SQL queries,
+    then demuxed back to the waiting callers. A lone request in the
+    window is dispatched through the normal single-question path so idle
+    traffic pays no batching latency.
+    """
+
+    def __init__(self, nlq_service, max_batch: int = 8, window_ms: int = 25):
+        self._nlq_service = nlq_service
+        self._max_batch = max_batch
+        self._window = window_ms / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def submit(self, question: str, tenant_id: str) -> str:
+        """Queue a question and wait for its generated SQL"""
+        loop = asyncio.get_running_loop()
+        # Lazy start so the flusher binds to the serving event loop
+        if self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush_loop())
+
+        future = loop.create_future()
+        await self._queue.put((question, tenant_id, future))
+        return await future
+
+    async def _flush_loop(self):
+        """Drain the queue in batches bounded by size and time window"""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self._window
+            while len(batch) < self._max_batch:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch: List[Tuple[str, str, asyncio.Future]]):
+        # Single pending request: no batching benefit, use the direct path
+        if len(batch) == 1:
+            question, tenant_id, future = batch[0]
+            try:
+                future.set_result(
+                    await self._nlq_service._create_sql_completion(question, tenant_id)
+                )
+            except Exception as e:
+                future.set_exception(e)
+            return
+
+        logger.info("Coalescing SQL generations", batch_size=len(batch))
+        try:
+            sql_queries = await self._batched_completion(batch)
+            for (_, _, future), sql_query in zip(batch, sql_queries):
+                future.set_result(sql_query)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _batched_completion(self, batch) -> List[str]:
+        """One completion answering every question in the batch"""
+        service = self._nlq_service
+        requests_json = json.dumps([
+            {"i": i, "question": question}
+            for i, (question, _, _) in enumerate(batch)
+        ])
+
+        response = await service._throttled_completion(
+            model=service.model,
+            messages=[
+                {"role": "system", "content": service._sql_system_prompt},
+                {"role": "system", "content": _BATCH_INSTRUCTIONS},
+                {"role": "user", "content": requests_json}
+            ],
+            temperature=service.temperature,
+            max_tokens=service.max_tokens * len(batch)
+        )
+
+        content = response.choices[0].message.content.strip().strip("` \n")
+        if content.startswith("json"):
+            content = content[4:].strip()
+        sql_queries = json.loads(content)
+
+        if not isinstance(sql_queries, list) or len(sql_queries) != len(batch):
+            raise ValueError(
+                f"Batched completion returned {len(sql_queries)} answers "
+                f"for {len(batch)} questions"
+            )
+        return [service._clean_sql(sql_query) for sql_query in sql_queries]
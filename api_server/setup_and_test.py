@@ -57,9 +57,10 @@ def test_database_connection():
         
         # Initialize database service
         db_service = DatabaseService()
-        
-        # Test connection
-        if db_service.test_connection():
+
+        # Test connection (async pool-backed check)
+        import asyncio
+        if asyncio.run(db_service.test_connection()):
             print("✅ Database connection successful!")
             return True
         else:
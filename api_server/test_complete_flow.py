@@ -1,69 +1,84 @@
 #!/usr/bin/env python3
 """
 Test script for the complete NLQ to Natural Language Response flow
+
+Fires all test questions concurrently over a shared httpx.AsyncClient
+(bounded by a semaphore) so total wall time is ~one request's latency
+instead of the sum of all of them.
 """
 
-import requests
-import json
-import os
+import asyncio
+import httpx
+
+BASE_URL = "http://localhost:8000"
+
+# Max in-flight requests; keeps the server from being flooded when the
+# question list grows
+MAX_CONCURRENCY = 20
+
+# Test data
+test_questions = [
+    {
+        "question": "How many users do we have?",
+        "tenant_id": "tenant_123"
+    }
+]
 
-def test_complete_flow():
+async def run_one(client: httpx.AsyncClient, sem: asyncio.Semaphore, test_case: dict):
+    """POST a single question, bounded by the shared semaphore"""
+    async with sem:
+        response = await client.post("/api/v1/query", json=test_case)
+        return test_case, response
+
+async def test_complete_flow(client: httpx.AsyncClient):
     """Test the complete flow from NLQ to natural language response"""
-    
-    # API endpoint
-    url = "http://localhost:8000/api/v1/query"
-    
-    # Test data
-    test_questions = [
-        {
-            "question": "How many users do we have?",
-            "tenant_id": "tenant_123"
-        }
-    ]
-    
+
     print("🚀 Testing Complete NLQ to Natural Language Response Flow")
     print("=" * 60)
-    
-    for i, test_case in enumerate(test_questions, 1):
-        print(f"\n📝 Test {i}: {test_case['question']}")
-        print("-" * 40)
-        
+
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    tasks = [run_one(client, sem, tc) for tc in test_questions]
+
+    # Print results as they arrive rather than waiting for the whole batch
+    for i, task in enumerate(asyncio.as_completed(tasks), 1):
         try:
-            # Make API request
-            response = requests.post(url, json=test_case, timeout=30)
-            
+            test_case, response = await task
+
+            print(f"\n📝 Test {i}: {test_case['question']}")
+            print("-" * 40)
+
             if response.status_code == 200:
                 result = response.json()
-                
+
                 print(f"✅ Success!")
                 print(f"   Question: {result['question']}")
                 print(f"   SQL Generated: {result['sql_query']}")
                 print(f"   Natural Language Response: {result['natural_language_response']}")
                 print(f"   Data Rows: {result['row_count']}")
-                
+
                 if result.get('data'):
                     print(f"   Sample Data: {result['data'][:2]}")  # Show first 2 rows
-                
+
             else:
                 print(f"❌ Error: {response.status_code}")
                 print(f"   Response: {response.text}")
-                
-        except requests.exceptions.RequestException as e:
+
+        except httpx.HTTPError as e:
             print(f"❌ Request failed: {e}")
         except Exception as e:
             print(f"❌ Unexpected error: {e}")
-    
+
     print("\n🎉 Testing completed!")
 
-def test_health_endpoints():
+async def test_health_endpoints(client: httpx.AsyncClient):
     """Test health check endpoint"""
-    
+
     print("\n🏥 Testing Health Endpoints")
     print("=" * 40)
-    
+
     # Test main health endpoint
     try:
-        response = requests.get("http://localhost:8000/health")
+        response = await client.get("/health")
         if response.status_code == 200:
             print("✅ Main health endpoint: OK")
         else:
@@ -71,25 +86,29 @@ def test_health_endpoints():
     except Exception as e:
         print(f"❌ Main health endpoint failed: {e}")
 
-if __name__ == "__main__":
+async def main():
     print("🔍 SaaS Product Usage Data Assistant - Complete Flow Test")
     print("=" * 70)
-    
-    # Check if API server is running
-    try:
-        response = requests.get("http://localhost:8000/health", timeout=5)
-        if response.status_code == 200:
-            print("✅ API server is running")
-        else:
-            print("❌ API server returned error status")
+
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as client:
+        # Check if API server is running
+        try:
+            response = await client.get("/health", timeout=5)
+            if response.status_code == 200:
+                print("✅ API server is running")
+            else:
+                print("❌ API server returned error status")
+                exit(1)
+        except httpx.HTTPError:
+            print("❌ API server is not running. Please start it first:")
+            print("   cd api_server && python main.py")
             exit(1)
-    except requests.exceptions.RequestException:
-        print("❌ API server is not running. Please start it first:")
-        print("   cd api_server && python main.py")
-        exit(1)
-    
-    # Test health endpoint
-    test_health_endpoints()
-    
-    # Test complete flow
-    test_complete_flow() 
\ No newline at end of file
+
+        # Test health endpoint
+        await test_health_endpoints(client)
+
+        # Test complete flow
+        await test_complete_flow(client)
+
+if __name__ == "__main__":
+    asyncio.run(main())
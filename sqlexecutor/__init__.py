@@ -7,5 +7,6 @@ for the SaaS Product Usage Data Assistant.
 
 from .db_service import DatabaseService
 from .db_config import db_config
+from .safety import is_query_safe
 
-__all__ = ['DatabaseService', 'db_config'] 
\ No newline at end of file
+__all__ = ['DatabaseService', 'db_config', 'is_query_safe'] 
\ No newline at end of file
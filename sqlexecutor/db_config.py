@@ -2,6 +2,9 @@ from pydantic_settings import BaseSettings
 from typing import Optional
 from pathlib import Path
 
+# Resolve the .env path once at import time instead of per construction
+_ENV_FILE = str(Path(__file__).parent.parent / "api_server" / ".env")
+
 class DatabaseConfig(BaseSettings):
     """Database configuration for Aiven PostgreSQL"""
     
@@ -20,6 +23,16 @@ class DatabaseConfig(BaseSettings):
     # Timeout settings
     DB_CONNECT_TIMEOUT: int = 10
     DB_QUERY_TIMEOUT: int = 30
+
+    # Result bounding: LIMIT injected into unbounded SELECTs
+    DB_MAX_ROWS: int = 10_000
+
+    # Schema info cache lifetime; the schema only changes at deploy time
+    DB_SCHEMA_TTL_SECONDS: int = 3600
+
+    # Query-result cache: empty REDIS_URL disables it
+    REDIS_URL: str = ""
+    QUERY_CACHE_TTL: int = 60
     
     @property
     def database_url(self) -> str:
@@ -40,7 +53,7 @@ class DatabaseConfig(BaseSettings):
     
     class Config:
         # Look for .env file in the api_server directory
-        env_file = str(Path(__file__).parent.parent / "api_server" / ".env")
+        env_file = _ENV_FILE
         case_sensitive = True
         extra = "ignore"  # Ignore extra fields from .env file
 
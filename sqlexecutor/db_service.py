@@ -1,74 +1,191 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import asyncio
+import asyncpg
+import hashlib
+import orjson
+import re
+import redis.asyncio as redis
+import sqlglot
+import time
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 import logging
 from .db_config import db_config
+from .sql_guard import analyze as analyze_query
 
 logger = logging.getLogger(__name__)
 
+# Parameterized tenant filter (tenant_id = $1). Keeping the query text
+# tenant-agnostic lets PostgreSQL reuse one cached plan across tenants.
+_TENANT_PARAM_RE = re.compile(r"\btenant_id\s*=\s*\$1\b", re.IGNORECASE)
+
+# Cached (expires_at, schema_info) shared across requests; guarded by a
+# lock so concurrent misses trigger a single information_schema query
+_SCHEMA_CACHE: Optional[tuple] = None
+_SCHEMA_LOCK = asyncio.Lock()
+
+# Shared Redis client for the query-result cache; None when no REDIS_URL
+# is configured. Hot analytics queries ("how many users") re-run the same
+# SQL on near-static data, so a short TTL takes them off the database.
+_redis_client: Optional[redis.Redis] = None
+
+def _get_redis() -> Optional[redis.Redis]:
+    """Lazily create the shared Redis client (disabled without REDIS_URL)"""
+    global _redis_client
+    if not db_config.REDIS_URL:
+        return None
+    if _redis_client is None:
+        _redis_client = redis.from_url(db_config.REDIS_URL, decode_responses=False)
+    return _redis_client
+
+def _result_cache_key(sql_query: str, tenant_id: str) -> str:
+    """Tenant-scoped fingerprint of the exact SQL text"""
+    digest = hashlib.blake2b(sql_query.encode(), digest_size=16).hexdigest()
+    return f"q:{tenant_id}:{digest}"
+
 class DatabaseService:
     """Database service for executing SQL queries against Aiven PostgreSQL"""
-    
+
     def __init__(self):
         self.config = db_config
         self.logger = logging.getLogger(__name__)
-    
-    def test_connection(self) -> bool:
+        self.pool: Optional[asyncpg.Pool] = None
+        self._pool_lock = asyncio.Lock()
+
+    async def init_pool(self) -> None:
+        """Create the shared connection pool (idempotent)
+
+        Reusing pooled connections avoids the TCP+TLS+auth handshake to
+        Aiven that previously happened on every query.
+        """
+        if self.pool is not None:
+            return
+
+        # Double-checked under a lock (same pattern as the schema cache)
+        # so concurrent first queries can't each create a pool and leak
+        # the overwritten one's connections
+        async with self._pool_lock:
+            if self.pool is not None:
+                return
+            self.pool = await asyncpg.create_pool(
+                host=self.config.DB_HOST,
+                port=self.config.DB_PORT,
+                database=self.config.DB_NAME,
+                user=self.config.DB_USER,
+                password=self.config.DB_PASSWORD,
+                ssl=self.config.DB_SSL_MODE,
+                min_size=1,
+                # Steady-state size plus burst headroom, mirroring the
+                # pool_size/max_overflow split the config already exposes
+                max_size=self.config.DB_POOL_SIZE + self.config.DB_MAX_OVERFLOW,
+                statement_cache_size=2048,
+                timeout=self.config.DB_CONNECT_TIMEOUT,
+                command_timeout=self.config.DB_QUERY_TIMEOUT
+            )
+            self.logger.info("Database connection pool initialized")
+
+    async def close_pool(self) -> None:
+        """Close the shared connection pool and the result-cache client"""
+        global _redis_client
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+        if _redis_client is not None:
+            await _redis_client.aclose()
+            _redis_client = None
+
+    async def test_connection(self) -> bool:
         """Test database connection"""
         try:
-            with psycopg2.connect(**self.config.connection_params) as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("SELECT 1")
-                    result = cursor.fetchone()
-                    self.logger.info("Database connection successful")
-                    return result[0] == 1
+            await self.init_pool()
+            async with self.pool.acquire() as conn:
+                result = await conn.fetchval("SELECT 1")
+                self.logger.info("Database connection successful")
+                return result == 1
         except Exception as e:
             self.logger.error(f"Database connection failed: {str(e)}")
             return False
-    
-    def execute_query(self, sql_query: str, tenant_id: str) -> Dict[str, Any]:
+
+    def _bound_query(self, sql_query: str) -> str:
+        """Return the query with a LIMIT injected when it has none"""
+        tree = sqlglot.parse_one(sql_query, read='postgres')
+        if tree.args.get('limit') is not None:
+            return sql_query
+        self.logger.info(f"Injected LIMIT {self.config.DB_MAX_ROWS} into query")
+        return tree.limit(self.config.DB_MAX_ROWS).sql(dialect='postgres')
+
+    async def execute_query(self, sql_query: str, tenant_id: str) -> Dict[str, Any]:
         """
         Execute SQL query with tenant isolation
-        
+
         Args:
             sql_query: SQL query to execute
             tenant_id: Tenant identifier for isolation
-            
+
         Returns:
             Dictionary containing query results and metadata
         """
         try:
-            # Validate query safety
-            if not self._is_query_safe(sql_query):
-                raise ValueError("Query contains unsafe operations")
-            
-            # Ensure tenant isolation
-            if not self._has_tenant_isolation(sql_query, tenant_id):
-                raise ValueError("Query must include tenant isolation")
-            
-            # Execute query
-            with psycopg2.connect(**self.config.connection_params) as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                    cursor.execute(sql_query)
-                    
-                    # Fetch results
-                    if cursor.description:
-                        columns = [desc[0] for desc in cursor.description]
-                        rows = cursor.fetchall()
-                        results = [dict(row) for row in rows]
+            # Validate safety and tenant isolation in a single AST pass
+            analyze_query(sql_query, tenant_id)
+
+            # Bound unbounded SELECTs: inject a LIMIT when none is present
+            # so "show me all events" can't stream millions of rows back
+            sql_query = self._bound_query(sql_query)
+
+            # Result cache: serve hot repeat queries straight from Redis.
+            # Cache errors are non-fatal — the query just runs normally.
+            cache = _get_redis()
+            cache_key = _result_cache_key(sql_query, tenant_id)
+            if cache is not None:
+                try:
+                    cached = await cache.get(cache_key)
+                    if cached is not None:
+                        self.logger.info(f"Query result cache hit: {cache_key}")
+                        return orjson.loads(cached)
+                    self.logger.info(f"Query result cache miss: {cache_key}")
+                except Exception as e:
+                    self.logger.warning(f"Query result cache lookup failed: {str(e)}")
+
+            # Execute query on a pooled connection, capped by a per-query
+            # statement timeout scoped to the transaction
+            await self.init_pool()
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(
+                        f"SET LOCAL statement_timeout = {self.config.DB_QUERY_TIMEOUT * 1000}"
+                    )
+                    statement = await conn.prepare(sql_query)
+                    if _TENANT_PARAM_RE.search(sql_query):
+                        rows = await statement.fetch(tenant_id)
                     else:
-                        columns = []
-                        results = []
-                    
-                    return {
-                        "success": True,
-                        "data": results,
-                        "columns": columns,
-                        "row_count": len(results),
-                        "sql_query": sql_query,
-                        "tenant_id": tenant_id
-                    }
-                    
+                        rows = await statement.fetch()
+
+                columns = [attr.name for attr in statement.get_attributes()]
+                # Single C-level pass Record -> dict; rows then flow to the
+                # orjson response layer without further copies
+                results = list(map(dict, rows))
+
+                result = {
+                    "success": True,
+                    "data": results,
+                    "columns": columns,
+                    "row_count": len(results),
+                    "sql_query": sql_query,
+                    "tenant_id": tenant_id
+                }
+
+                if cache is not None:
+                    try:
+                        await cache.set(
+                            cache_key,
+                            orjson.dumps(result, default=str),
+                            ex=self.config.QUERY_CACHE_TTL
+                        )
+                    except Exception as e:
+                        self.logger.warning(f"Query result cache store failed: {str(e)}")
+
+                return result
+
         except Exception as e:
             self.logger.error(f"Query execution failed: {str(e)}")
             return {
@@ -77,75 +194,71 @@ class DatabaseService:
                 "sql_query": sql_query,
                 "tenant_id": tenant_id
             }
-    
-    def _is_query_safe(self, sql_query: str) -> bool:
-        """Check if SQL query is safe to execute"""
-        query_upper = sql_query.upper().strip()
-        
-        # Must start with SELECT
-        if not query_upper.startswith('SELECT'):
-            return False
-        
-        # Check for dangerous keywords
-        dangerous_keywords = [
-            'INSERT', 'UPDATE', 'DELETE', 'DROP', 'TRUNCATE', 'ALTER',
-            'CREATE', 'GRANT', 'REVOKE', 'EXECUTE', 'EXEC', 'UNION'
-        ]
-        
-        for keyword in dangerous_keywords:
-            if keyword in query_upper:
-                return False
-        
-        return True
-    
-    def _has_tenant_isolation(self, sql_query: str, tenant_id: str) -> bool:
-        """Verify that query includes tenant isolation"""
-        query_lower = sql_query.lower()
-        tenant_condition = f"tenant_id = '{tenant_id}'"
-        
-        return tenant_condition in query_lower
-    
-    def get_schema_info(self) -> str:
-        """Get database schema information"""
+
+    async def get_schema_info(self) -> str:
+        """Get database schema information (cached between deploys)"""
+        global _SCHEMA_CACHE
+
+        # Fast path: unexpired cached schema string
+        if _SCHEMA_CACHE is not None and _SCHEMA_CACHE[0] > time.monotonic():
+            return _SCHEMA_CACHE[1]
+
+        async with _SCHEMA_LOCK:
+            # Re-check under the lock; another task may have refreshed
+            if _SCHEMA_CACHE is not None and _SCHEMA_CACHE[0] > time.monotonic():
+                return _SCHEMA_CACHE[1]
+            return await self._fetch_schema_info()
+
+    async def _fetch_schema_info(self) -> str:
+        """Query information_schema and format the schema string"""
+        global _SCHEMA_CACHE
         try:
-            with psycopg2.connect(**self.config.connection_params) as conn:
-                with conn.cursor() as cursor:
-                    # Query to get table information
-                    schema_query = """
-                    SELECT 
-                        table_name,
-                        column_name,
-                        data_type,
-                        is_nullable
-                    FROM information_schema.columns 
+            await self.init_pool()
+            async with self.pool.acquire() as conn:
+                # Query to get table information
+                schema_query = """
+                SELECT
+                    table_name,
+                    column_name,
+                    data_type,
+                    is_nullable
+                FROM information_schema.columns
+                WHERE table_schema = 'public'
+                AND table_name IN (
+                    SELECT table_name
+                    FROM information_schema.tables
                     WHERE table_schema = 'public'
-                    AND table_name IN (
-                        SELECT table_name 
-                        FROM information_schema.tables 
-                        WHERE table_schema = 'public'
-                    )
-                    ORDER BY table_name, ordinal_position;
-                    """
-                    
-                    cursor.execute(schema_query)
-                    schema_data = cursor.fetchall()
-                    
-                    # Format schema information
-                    schema_info = "Database Schema:\n"
-                    current_table = None
-                    
-                    for row in schema_data:
-                        table_name, column_name, data_type, is_nullable = row
-                        
-                        if table_name != current_table:
-                            schema_info += f"\nTable: {table_name}\n"
-                            current_table = table_name
-                        
-                        nullable = "NULL" if is_nullable == "YES" else "NOT NULL"
-                        schema_info += f"- {column_name} ({data_type}) {nullable}\n"
-                    
-                    return schema_info
-                    
+                )
+                ORDER BY table_name, ordinal_position;
+                """
+
+                schema_data = await conn.fetch(schema_query)
+
+                # Format schema information
+                schema_info = "Database Schema:\n"
+                current_table = None
+
+                for row in schema_data:
+                    table_name = row['table_name']
+
+                    if table_name != current_table:
+                        schema_info += f"\nTable: {table_name}\n"
+                        current_table = table_name
+
+                    nullable = "NULL" if row['is_nullable'] == "YES" else "NOT NULL"
+                    schema_info += f"- {row['column_name']} ({row['data_type']}) {nullable}\n"
+
+                _SCHEMA_CACHE = (
+                    time.monotonic() + self.config.DB_SCHEMA_TTL_SECONDS,
+                    schema_info
+                )
+                return schema_info
+
         except Exception as e:
             self.logger.error(f"Failed to get schema: {str(e)}")
-            return "Error retrieving schema information" 
\ No newline at end of file
+            return "Error retrieving schema information"
+
+@lru_cache(maxsize=1)
+def get_db_service() -> DatabaseService:
+    """Return the shared DatabaseService singleton"""
+    return DatabaseService()
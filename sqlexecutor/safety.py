@@ -0,0 +1,30 @@
+"""
+Shared SQL safety checks for generated queries
+"""
+
+import re
+
+# Single compiled scan with word boundaries: one linear pass over the
+# query, and no false positives on identifiers like updated_at/union_id
+_DANGEROUS_RE = re.compile(
+    r'\b(?:INSERT|UPDATE|DELETE|DROP|TRUNCATE|ALTER|'
+    r'CREATE|GRANT|REVOKE|EXECUTE|EXEC|UNION)\b',
+    re.IGNORECASE
+)
+
+_SELECT_RE = re.compile(r'^\s*SELECT\b', re.IGNORECASE)
+
+def is_query_safe(sql_query: str) -> bool:
+    """
+    Check that a SQL query is safe to execute
+
+    Args:
+        sql_query: SQL query to validate
+
+    Returns:
+        True if the query is a SELECT containing no dangerous keywords,
+        False otherwise
+    """
+    if not _SELECT_RE.match(sql_query):
+        return False
+    return _DANGEROUS_RE.search(sql_query) is None
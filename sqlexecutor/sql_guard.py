@@ -0,0 +1,70 @@
+"""
+AST-based guard for generated SQL: SELECT-only plus tenant isolation
+"""
+
+import sqlglot
+from sqlglot import exp
+
+from .safety import is_query_safe
+
+# Statement/expression types that must never appear in a generated query.
+# Resolved by name so minor sqlglot version drift doesn't break import.
+_FORBIDDEN_NODES = tuple(
+    node for node in (
+        getattr(exp, name, None)
+        for name in ('Insert', 'Update', 'Delete', 'Drop', 'Create',
+                     'Alter', 'AlterTable', 'Grant', 'Command', 'Union')
+    ) if node is not None
+)
+
+def analyze(sql_query: str, tenant_id: str) -> None:
+    """
+    Validate a generated query in a single AST pass
+
+    Unlike substring checks, the parsed form is robust to spacing,
+    quoting, casing and table aliases (e.g. t.tenant_id).
+
+    Args:
+        sql_query: SQL query to validate
+        tenant_id: Tenant identifier the query must be scoped to
+
+    Raises:
+        ValueError: if the query is not a plain SELECT, contains a
+            forbidden operation, or lacks a tenant_id filter
+    """
+    # Cheap regex reject before paying for a parse
+    if not is_query_safe(sql_query):
+        raise ValueError("Query contains unsafe operations")
+
+    # SqlglotError covers TokenError too, which parse errors raised
+    # before the parser proper even runs (and is not a ParseError)
+    try:
+        tree = sqlglot.parse_one(sql_query, read='postgres')
+    except sqlglot.errors.SqlglotError as e:
+        raise ValueError(f"Query could not be parsed: {e}")
+
+    if not isinstance(tree, exp.Select):
+        raise ValueError("Only SELECT statements are allowed")
+
+    if next(iter(tree.find_all(*_FORBIDDEN_NODES)), None) is not None:
+        raise ValueError("Query contains unsafe operations")
+
+    if not _has_tenant_predicate(tree, tenant_id):
+        raise ValueError("Query must include tenant isolation")
+
+def _has_tenant_predicate(tree: exp.Select, tenant_id: str) -> bool:
+    """True if an equality predicate pins tenant_id to $1 or the literal"""
+    for predicate in tree.find_all(exp.EQ):
+        column = predicate.this
+        if not (isinstance(column, exp.Column) and column.name.lower() == 'tenant_id'):
+            continue
+
+        value = predicate.expression
+        # Postgres numbered parameters ($1) parse to Parameter; named or
+        # question-mark placeholders parse to Placeholder
+        if isinstance(value, (exp.Parameter, exp.Placeholder)):
+            return True
+        if isinstance(value, exp.Literal) and value.this == tenant_id:
+            return True
+
+    return False
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test script for the SQL rewrite path that runs before execution:
+sql_guard.analyze plus DatabaseService._bound_query, exercised on the
+parameterized (tenant_id = $1) query shape the NLQ prompt mandates.
+
+Needs no database connection — it only covers the parse/rewrite stage.
+"""
+
+from sqlexecutor.db_service import DatabaseService
+from sqlexecutor.sql_guard import analyze
+
+
+def test_rewrite_path():
+    """Run the guard + LIMIT injection on representative queries"""
+
+    db_service = DatabaseService()
+    max_rows = db_service.config.DB_MAX_ROWS
+    failures = 0
+
+    print("🚀 Testing SQL guard + LIMIT injection rewrite path")
+    print("=" * 60)
+
+    # (query, should_pass_guard, expects_limit_injected)
+    cases = [
+        ("SELECT COUNT(*) FROM users WHERE tenant_id = $1", True, True),
+        ("SELECT u.name FROM users u "
+         "JOIN usage_events e ON e.user_id = u.id "
+         "WHERE u.tenant_id = $1", True, True),
+        ("SELECT * FROM usage_events WHERE tenant_id = $1 LIMIT 50", True, False),
+        ("SELECT COUNT(*) FROM users WHERE tenant_id = 'tenant_123'", True, True),
+        ("SELECT * FROM users", False, False),
+        ("DELETE FROM users WHERE tenant_id = $1", False, False),
+    ]
+
+    for i, (query, should_pass, expects_limit) in enumerate(cases, 1):
+        print(f"\n📝 Case {i}: {query[:60]}")
+        try:
+            analyze(query, "tenant_123")
+            passed_guard = True
+        except ValueError as e:
+            passed_guard = False
+            reason = str(e)
+
+        if passed_guard != should_pass:
+            failures += 1
+            print(f"❌ Guard verdict wrong: expected pass={should_pass}")
+            continue
+
+        if not passed_guard:
+            print(f"✅ Rejected as expected: {reason}")
+            continue
+
+        rewritten = db_service._bound_query(query)
+        limit_injected = f"LIMIT {max_rows}" in rewritten
+        if limit_injected != expects_limit:
+            failures += 1
+            print(f"❌ LIMIT injection wrong: {rewritten}")
+            continue
+
+        if "$1" in query and "$1" not in rewritten:
+            failures += 1
+            print(f"❌ Rewrite lost the $1 parameter: {rewritten}")
+            continue
+
+        print(f"✅ Rewritten: {rewritten}")
+
+    print("\n" + "=" * 60)
+    if failures:
+        print(f"❌ {failures} case(s) failed")
+    else:
+        print("🎉 All rewrite cases passed!")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    exit(0 if test_rewrite_path() else 1)